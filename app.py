@@ -12,6 +12,7 @@ import io_read_write
 import wrangle
 import columns
 import helpers
+import optimize
 
 # Import Data Required
 df_nursing_services = io_read_write.read_xlsx("./MoH_Model_Input.xlsx", sheet_name="Nursing Services")
@@ -20,20 +21,20 @@ df_health_clusters = io_read_write.read_xlsx("./MoH_Model_Input.xlsx", sheet_nam
 df_demand_data_input = io_read_write.read_xlsx("./MoH_Model_Input.xlsx", sheet_name="Demand Data by Speciality")
 df_scenario_criteria = io_read_write.read_xlsx("./MoH_Model_Input.xlsx", sheet_name="Scenarios")
 
-# Melt Relevant Datasets
-df_demand_data = df_demand_data_input.melt(
-    id_vars=[helpers.denormalize_text(columns.PATIENT_CARE_AREA), helpers.denormalize_text(columns.NURSING_SERVICE), helpers.denormalize_text(columns.SELECTED_DRIVER)],
-    var_name="Cluster",
-    value_name=columns.DRIVER_VALUE
-)
-
 # Normalize Column Names
 df_nursing_services = wrangle.normalize_column_names(df_nursing_services)
 df_benchmarks = wrangle.normalize_column_names(df_benchmarks)
 df_health_clusters = wrangle.normalize_column_names(df_health_clusters)
-df_demand_data = wrangle.normalize_column_names(df_demand_data)
 df_scenario_criteria = wrangle.normalize_column_names(df_scenario_criteria)
 
+# Split demand data into keys and a (service x cluster) matrix, columns ordered as in Health Clusters
+df_demand_data_keys, demand_data_matrix = wrangle.wide_to_matrix(
+    df=df_demand_data_input,
+    id_cols=[helpers.denormalize_text(columns.PATIENT_CARE_AREA), helpers.denormalize_text(columns.NURSING_SERVICE), helpers.denormalize_text(columns.SELECTED_DRIVER)],
+    value_cols=df_health_clusters[columns.CLUSTER].tolist()
+)
+df_demand_data_keys = wrangle.normalize_column_names(df_demand_data_keys)
+
 # %% [markdown]
 # # Generate Benchmarks
 
@@ -74,14 +75,7 @@ df_benchmarks_scenarios = (
     .reset_index()
 ).drop(columns=["level_3"])
 
-df_benchmarks_scenarios[columns.SELECTED_DRIVER] = (
-    df_benchmarks_scenarios[columns.DRIVER]
-    .astype(str)
-    .str.split(" /", n=1)
-    .str[1]
-    .add("s")
-    .str.replace(" ", "", regex=False)
-)
+df_benchmarks_scenarios[columns.SELECTED_DRIVER] = helpers.driver_to_selected_driver(df_benchmarks_scenarios[columns.DRIVER])
 
 # %% [markdown]
 # # Calculate Demand Data by Cluster - Current Year
@@ -92,8 +86,11 @@ df_demand_current_year = wrangle.expand_df_by_values(df = df_nursing_services, n
 df_demand_current_year[columns.REGION] = wrangle.vlookup_df(left_df = df_demand_current_year, right_df = df_health_clusters, left_on = [columns.CLUSTER], right_on = [columns.CLUSTER], return_col = columns.REGION)
 
 
-# Grab the driver value from the demand data
-df_demand_current_year[columns.DRIVER_VALUE] = wrangle.vlookup_df(left_df = df_demand_current_year, right_df = df_demand_data, left_on = [columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER, columns.CLUSTER], right_on = [columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER, columns.CLUSTER], return_col = columns.DRIVER_VALUE)
+# Grab the driver value from the demand matrix (rows are service-major, clusters in Health Clusters order)
+_n_clusters = len(df_health_clusters)
+_demand_data_rows = wrangle.lookup_positions(left_df = df_nursing_services, right_df = df_demand_data_keys, left_on = [columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER], right_on = [columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER])
+_driver_values = wrangle.take_from_matrix(matrix = demand_data_matrix, row_positions = np.repeat(_demand_data_rows, _n_clusters), col_positions = np.tile(np.arange(_n_clusters), len(df_nursing_services)))
+df_demand_current_year[columns.DRIVER_VALUE] = _driver_values
 
 # Grab benchmark Value for each scenario
 df_demand_current_year = wrangle.expand_df_by_values(df = df_demand_current_year, new_col = columns.SCENARIO_NAME, values = df_scenario_criteria[columns.SCENARIO_NAME].tolist())
@@ -128,6 +125,53 @@ excess = sum_demands - df_demand_current_year[columns.DEMAND]
 df_demand_current_year[columns.APRN_DEMAND] -= excess
 df_demand_current_year[columns.APRN_DEMAND] = df_demand_current_year[columns.APRN_DEMAND].clip(lower=0)
 
+# %% [markdown]
+# # Optimize Percentiles by Cluster and Patient Care Area
+
+# %%
+if config.OPTIMIZE_PERCENTILES:
+    _optimization_quantiles = sorted(set(config.OPTIMIZATION_PERCENTILES) | {0.5})
+
+    df_benchmarks_optimization = (
+        df_benchmarks
+        [df_benchmarks[columns.PATIENT_CARE_AREA] != "Overall"]
+        .groupby([columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.DRIVER], dropna=False)
+        .apply(helpers.calc_stats_scenarios, quantiles = _optimization_quantiles, value_col=columns.RATIO_VALUE, include_groups=False)
+        .reset_index()
+    ).drop(columns=["level_3"])
+    df_benchmarks_optimization[columns.SELECTED_DRIVER] = helpers.driver_to_selected_driver(df_benchmarks_optimization[columns.DRIVER])
+
+    _ratios = optimize.benchmark_ratio_matrix(df_services = df_nursing_services, df_quantiles = df_benchmarks_optimization, percentiles = sorted(config.OPTIMIZATION_PERCENTILES))
+    _median_ratios = optimize.benchmark_ratio_matrix(df_services = df_nursing_services, df_quantiles = df_benchmarks_optimization, percentiles = [0.5])[:, 0]
+
+    df_demand_optimized = optimize.optimize_percentiles(
+        df_services = df_nursing_services,
+        df_clusters = df_health_clusters,
+        driver_values = _driver_values.reshape(len(df_nursing_services), _n_clusters),
+        ratios = _ratios,
+        median_ratios = _median_ratios,
+        percentiles = sorted(config.OPTIMIZATION_PERCENTILES),
+        budget = config.OPTIMIZATION_BUDGET,
+        budget_type = config.OPTIMIZATION_BUDGET_TYPE,
+        level_costs = [config.TECHNICIAN_COST, config.REGISTERED_NURSE_COST, config.APRN_COST]
+    )
+
+    df_percentiles_optimized = (
+        df_demand_optimized
+        .groupby([columns.CLUSTER, columns.REGION, columns.PATIENT_CARE_AREA], observed=True, sort=False)
+        .agg({
+            columns.PERCENTILE: "first",
+            columns.DEMAND: "sum",
+            columns.TECHNICIAN_DEMAND: "sum",
+            columns.REGISTERED_NURSE_DEMAND: "sum",
+            columns.APRN_DEMAND: "sum",
+            columns.MEDIAN_DEMAND: "sum",
+            columns.SHORTFALL: "sum",
+            columns.COST: "sum",
+        })
+        .reset_index()
+    )
+
 # %% [markdown]
 # # Save Files
 
@@ -138,6 +182,10 @@ if config.GENERATE_FILES:
     df_output_dictionary = {
         "Output by Cluster by Speciality": df_demand_current_year_denorm,
     }
+
+    if config.OPTIMIZE_PERCENTILES:
+        df_output_dictionary["Optimized Percentiles"] = wrangle.denormalize_column_names(df_percentiles_optimized)
+        df_output_dictionary["Optimized by Speciality"] = wrangle.denormalize_column_names(df_demand_optimized)
     
     io_read_write.write_excel_multiple(df_dict = df_output_dictionary, filename = "MoH_Nurses_WFP_Tool_Output.xlsx", timestamp = False)
 
@@ -31,3 +31,6 @@ PERCENTILE = "percentile"
 
 DEMAND = "demand"
 
+MEDIAN_DEMAND = "median_demand"
+SHORTFALL = "shortfall"
+COST = "cost"
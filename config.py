@@ -3,5 +3,16 @@ CURRENT_YEAR = 2025
 PROJECTION_LAST_YEAR = 2030
 GENERATE_FILES = True
 
+# Percentile Optimization
+OPTIMIZE_PERCENTILES = False
+OPTIMIZATION_BUDGET_TYPE = "headcount"  # "headcount" or "cost"
+OPTIMIZATION_BUDGET = 8500
+OPTIMIZATION_PERCENTILES = [0.1, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9]
+
+# Cost per nurse by level (relative weights, replace with annual cost per FTE when available)
+TECHNICIAN_COST = 1.0
+REGISTERED_NURSE_COST = 1.0
+APRN_COST = 1.0
+
 # Global Variables
 ABBREVIATIONS = ["Aprn"]
\ No newline at end of file
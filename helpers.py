@@ -108,4 +108,18 @@ def denormalize_text(s: str) -> str:
     # Replace multiple underscores with single space
     clean_str = s.replace("_", " ")
     clean_str = " ".join(clean_str.split())
-    return clean_str.title()
\ No newline at end of file
+    return clean_str.title()
+
+def driver_to_selected_driver(driver: pd.Series) -> pd.Series:
+    """
+    Convert a benchmark driver (ratio definition) to the matching selected driver label.
+    E.g. 'Nurse / Patient' -> 'Patients', 'Nurse / Physician' -> 'Physicians'
+    """
+    return (
+        driver
+        .astype(str)
+        .str.split(" /", n=1)
+        .str[1]
+        .add("s")
+        .str.replace(" ", "", regex=False)
+    )
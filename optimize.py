@@ -0,0 +1,197 @@
+import pandas as pd
+import numpy as np
+from typing import Sequence
+
+import columns
+import wrangle
+
+def benchmark_ratio_matrix(
+    df_services: pd.DataFrame,
+    df_quantiles: pd.DataFrame,
+    percentiles: Sequence[float]
+) -> np.ndarray:
+    """
+    Arrange benchmark quantiles into a (service × percentile) matrix aligned with `df_services`.
+
+    Parameters
+    ----------
+    df_services : pd.DataFrame
+        Nursing services, one row per service.
+    df_quantiles : pd.DataFrame
+        Long benchmark quantile table as produced with `helpers.calc_stats_scenarios`,
+        including the selected driver column.
+    percentiles : Sequence[float]
+        Percentiles to return, in column order.
+
+    Returns
+    -------
+    np.ndarray
+        Ratio matrix of shape (len(df_services), len(percentiles)), 0 where no benchmark exists.
+    """
+    keys = [columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER]
+    ratios = np.zeros((len(df_services), len(percentiles)), dtype="float64")
+    for k, percentile in enumerate(percentiles):
+        df_percentile = df_quantiles[df_quantiles[columns.PERCENTILE] == str(percentile)]
+        ratio = wrangle.vlookup_df(left_df=df_services, right_df=df_percentile, left_on=keys, right_on=keys, return_col=columns.PERCENTILE_VALUE, default=0)
+        ratios[:, k] = ratio.to_numpy(dtype="float64", na_value=0)
+    return ratios
+
+def split_by_nursing_level(demand: np.ndarray, shares: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Distribute demand across technician / registered nurse / APRN the same way as the scenario run:
+    floor each share, then adjust APRN so the levels never exceed total demand.
+
+    Parameters
+    ----------
+    demand : np.ndarray
+        Integer demand of shape (services, ...).
+    shares : np.ndarray
+        Technician, registered nurse and APRN shares of shape (services, 3).
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        Technician, registered nurse and APRN demand, each shaped like `demand`.
+    """
+    shares = shares.reshape(shares.shape[:1] + (1,) * (demand.ndim - 1) + (3,))
+    technician = np.floor(demand * shares[..., 0]).astype(int)
+    registered_nurse = np.floor(demand * shares[..., 1]).astype(int)
+    aprn = np.floor(demand * shares[..., 2]).astype(int)
+    aprn = np.clip(aprn - (technician + registered_nurse + aprn - demand), 0, None)
+    return technician, registered_nurse, aprn
+
+def allocate_budget(cost: np.ndarray, shortfall: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Choose one option per group to minimize total shortfall with total cost within `budget`.
+
+    Greedy marginal analysis: every group starts at its first (cheapest) option, then the upgrade
+    with the largest shortfall reduction per unit of extra cost is applied until no upgrade fits.
+    Only the upgraded group's row is re-evaluated after each step.
+
+    Parameters
+    ----------
+    cost : np.ndarray
+        Cost of each option, shape (groups, options), non-decreasing along options.
+    shortfall : np.ndarray
+        Shortfall of each option, same shape as `cost`.
+    budget : float
+        Total cost cap.
+
+    Returns
+    -------
+    np.ndarray
+        Chosen option index per group.
+    """
+    n_groups, n_options = cost.shape
+    choice = np.zeros(n_groups, dtype=int)
+    spent = cost[:, 0].sum()
+    if spent > budget:
+        raise ValueError(f"Budget {budget:,.0f} is below the minimum required by the lowest percentile ({spent:,.0f}).")
+
+    option_idx = np.arange(n_options)
+    extra_cost = cost - cost[:, :1]
+    gain = shortfall[:, :1] - shortfall
+    while True:
+        feasible = (option_idx > choice[:, None]) & (gain > 0) & (extra_cost <= budget - spent)
+        if not feasible.any():
+            break
+        efficiency = np.divide(gain, extra_cost, out=np.full(gain.shape, np.inf), where=extra_cost > 0)
+        efficiency = np.where(feasible, efficiency, -np.inf)
+        g, k = np.unravel_index(np.argmax(efficiency), efficiency.shape)
+
+        # Apply the upgrade and re-base only this group's marginal cost and gain
+        spent += extra_cost[g, k]
+        choice[g] = k
+        extra_cost[g] = cost[g] - cost[g, k]
+        gain[g] = shortfall[g, k] - shortfall[g]
+    return choice
+
+def optimize_percentiles(
+    df_services: pd.DataFrame,
+    df_clusters: pd.DataFrame,
+    driver_values: np.ndarray,
+    ratios: np.ndarray,
+    median_ratios: np.ndarray,
+    percentiles: Sequence[float],
+    budget: float,
+    budget_type: str = "headcount",
+    level_costs: Sequence[float] = (1.0, 1.0, 1.0)
+) -> pd.DataFrame:
+    """
+    Search the percentile per (cluster, patient care area) that minimizes the shortfall against
+    benchmark median demand, with total headcount or cost capped at `budget`.
+
+    Demand for every candidate percentile is evaluated once as a (service × cluster × percentile)
+    array; the search itself only works on the aggregated (group × percentile) tables.
+
+    Parameters
+    ----------
+    df_services : pd.DataFrame
+        Nursing services, one row per service, with patient care area and nursing level shares.
+    df_clusters : pd.DataFrame
+        Health clusters, one row per cluster.
+    driver_values : np.ndarray
+        Driver value per (service, cluster), shape (len(df_services), len(df_clusters)).
+    ratios : np.ndarray
+        Benchmark ratio per (service, percentile), see `benchmark_ratio_matrix`.
+    median_ratios : np.ndarray
+        Median benchmark ratio per service.
+    percentiles : Sequence[float]
+        Candidate percentiles, ascending, matching the columns of `ratios`.
+    budget : float
+        Total headcount or cost cap.
+    budget_type : str, default "headcount"
+        "headcount" to cap total demand, "cost" to cap total cost.
+    level_costs : Sequence[float], default (1.0, 1.0, 1.0)
+        Cost per technician, registered nurse and APRN.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per (service, cluster) with the chosen percentile, demand by nursing level,
+        median demand, shortfall and cost.
+    """
+    if budget_type not in ("headcount", "cost"):
+        raise ValueError(f"budget_type must be 'headcount' or 'cost', got {budget_type!r}.")
+
+    n_services, n_clusters = driver_values.shape
+    driver_values = np.nan_to_num(driver_values)
+    shares = df_services[[columns.TECHNICIAN_PERCENTAGE, columns.REGISTERED_NURSE_PERCENTAGE, columns.APRN_PERCENTAGE]].to_numpy(dtype="float64", na_value=0)
+    level_costs = np.asarray(level_costs, dtype="float64")
+
+    # Evaluate every option at once: (service, cluster, percentile)
+    demand = np.ceil(driver_values[:, :, None] * ratios[:, None, :]).astype(int)
+    median_demand = np.ceil(driver_values * median_ratios[:, None]).astype(int)
+    technician, registered_nurse, aprn = split_by_nursing_level(demand, shares)
+    cost = technician * level_costs[0] + registered_nurse * level_costs[1] + aprn * level_costs[2]
+    shortfall = np.clip(median_demand[:, :, None] - demand, 0, None)
+
+    # Aggregate services into (cluster, patient care area) groups
+    area_codes, areas = pd.factorize(df_services[columns.PATIENT_CARE_AREA])
+    area_onehot = np.zeros((len(areas), n_services))
+    area_onehot[area_codes, np.arange(n_services)] = 1
+    budget_used = demand if budget_type == "headcount" else cost
+    group_budget_used = np.einsum("as,sck->cak", area_onehot, budget_used).reshape(n_clusters * len(areas), -1)
+    group_shortfall = np.einsum("as,sck->cak", area_onehot, shortfall).reshape(n_clusters * len(areas), -1)
+
+    choice = allocate_budget(group_budget_used, group_shortfall, budget).reshape(n_clusters, len(areas))
+    chosen = choice[:, area_codes].T  # (service, cluster)
+    service_idx, cluster_idx = np.indices((n_services, n_clusters))
+
+    df_out = wrangle.expand_df_by_values(
+        df=df_services[[columns.PATIENT_CARE_AREA, columns.NURSING_SERVICE, columns.SELECTED_DRIVER]],
+        new_col=columns.CLUSTER,
+        values=df_clusters[columns.CLUSTER].tolist()
+    )
+    df_out[columns.REGION] = wrangle.vlookup_df(left_df=df_out, right_df=df_clusters, left_on=[columns.CLUSTER], right_on=[columns.CLUSTER], return_col=columns.REGION)
+    df_out[columns.DRIVER_VALUE] = driver_values.ravel()
+    df_out[columns.PERCENTILE] = np.asarray(percentiles)[chosen].ravel()
+    df_out[columns.PERCENTILE_VALUE] = ratios[service_idx, chosen].ravel()
+    df_out[columns.DEMAND] = demand[service_idx, cluster_idx, chosen].ravel()
+    df_out[columns.TECHNICIAN_DEMAND] = technician[service_idx, cluster_idx, chosen].ravel()
+    df_out[columns.REGISTERED_NURSE_DEMAND] = registered_nurse[service_idx, cluster_idx, chosen].ravel()
+    df_out[columns.APRN_DEMAND] = aprn[service_idx, cluster_idx, chosen].ravel()
+    df_out[columns.MEDIAN_DEMAND] = median_demand.ravel()
+    df_out[columns.SHORTFALL] = shortfall[service_idx, cluster_idx, chosen].ravel()
+    df_out[columns.COST] = cost[service_idx, cluster_idx, chosen].ravel()
+    return df_out
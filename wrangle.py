@@ -241,3 +241,104 @@ def vlookup_df(
         result = merged[return_col]
     return result
 
+
+def wide_to_matrix(
+    df: pd.DataFrame,
+    id_cols: list[str],
+    value_cols: list[str],
+    dtype: str = "float64"
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Split a wide DataFrame into its key columns and a 2D NumPy matrix of values,
+    without melting it into a long table.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Wide DataFrame with one row per key and one column per value label.
+    id_cols : list[str]
+        Columns identifying each row (kept as a small keys DataFrame).
+    value_cols : list[str]
+        Value columns, in the order the matrix columns should follow.
+        Labels missing from `df` become all-NaN columns.
+    dtype : str, default "float64"
+        NumPy dtype of the returned matrix.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray]
+        Keys DataFrame (row i describes matrix row i) and a matrix of shape
+        (len(df), len(value_cols)).
+    """
+    keys = df[id_cols].reset_index(drop=True)
+    matrix = df.reindex(columns=list(value_cols)).to_numpy(dtype=dtype, na_value=np.nan)
+    return keys, matrix
+
+def lookup_positions(
+    left_df: pd.DataFrame,
+    right_df: pd.DataFrame,
+    left_on: str | list[str],
+    right_on: str | list[str]
+) -> np.ndarray:
+    """
+    Like `vlookup_df`, but return the row position of the first match in `right_df`
+    instead of a value, so results can be used to index a matrix.
+
+    Parameters
+    ----------
+    left_df : pd.DataFrame
+        The DataFrame containing the keys to look up.
+    right_df : pd.DataFrame
+        The DataFrame whose row positions are returned.
+    left_on : str or list of str
+        Column(s) in `left_df` whose values will be looked up.
+    right_on : str or list of str
+        Column(s) in `right_df` where matching keys will be searched.
+
+    Returns
+    -------
+    np.ndarray
+        Integer array aligned with `left_df`, -1 where no match is found.
+    """
+    if isinstance(right_on, str):
+        right_on = [right_on]
+    right_keys = right_df[right_on].reset_index(drop=True).drop_duplicates(keep="first")
+    right_keys["_position"] = right_keys.index
+    positions = vlookup_df(
+        left_df=left_df,
+        right_df=right_keys,
+        left_on=left_on,
+        right_on=right_on,
+        return_col="_position",
+        default=-1
+    )
+    return positions.to_numpy(dtype="int64")
+
+def take_from_matrix(
+    matrix: np.ndarray,
+    row_positions: np.ndarray,
+    col_positions: np.ndarray
+) -> np.ndarray:
+    """
+    Gather matrix values at paired (row, column) positions.
+
+    Parameters
+    ----------
+    matrix : np.ndarray
+        2D matrix, e.g. from `wide_to_matrix`.
+    row_positions : np.ndarray
+        Row position per output value (-1 for "not found", e.g. from `lookup_positions`).
+    col_positions : np.ndarray
+        Column position per output value, same length as `row_positions`.
+
+    Returns
+    -------
+    np.ndarray
+        Float array of gathered values, NaN where the row position is -1.
+    """
+    row_positions = np.asarray(row_positions)
+    col_positions = np.asarray(col_positions)
+    found = row_positions >= 0
+    values = np.full(row_positions.shape, np.nan, dtype="float64")
+    values[found] = matrix[row_positions[found], col_positions[found]]
+    return values